@@ -21,6 +21,10 @@ from utils.wrappers import make_env_a2c_atari
 from utils.plot import visdom_plot
 from baselines.common.vec_env.dummy_vec_env import DummyVecEnv
 from baselines.common.vec_env.subproc_vec_env import SubprocVecEnv
+try: #shared-memory obs buffers skip a copy per step when available
+    from baselines.common.vec_env.shmem_vec_env import ShmemVecEnv
+except ImportError:
+    ShmemVecEnv = None
 
 from utils.hyperparameters import Config
 from agents.PPO import Model
@@ -75,7 +79,14 @@ if __name__=='__main__':
 
     env_id = "PongNoFrameskip-v4"
     envs = [make_env_a2c_atari(env_id, seed, i, log_dir) for i in range(config.num_agents)]
-    envs = SubprocVecEnv(envs) if config.num_agents > 1 else DummyVecEnv(envs)
+    if config.num_agents <= 1:
+        envs = DummyVecEnv(envs)
+    elif config.USE_SHMEM_VECENV and ShmemVecEnv is not None:
+        #fork context: the env thunks are closures and can't be pickled
+        #across a spawn start
+        envs = ShmemVecEnv(envs, context='fork')
+    else:
+        envs = SubprocVecEnv(envs)
 
     obs_shape = envs.observation_space.shape
     obs_shape = (obs_shape[0] * 4, *obs_shape[1:])
@@ -85,9 +96,29 @@ if __name__=='__main__':
     current_obs = torch.zeros(config.num_agents, *obs_shape,
                     device=config.device, dtype=torch.float)
 
+    #pinned staging buffers so env outputs upload without a sync every step;
+    #persistent device-side twins avoid a fresh allocation per step
+    use_pinned = config.device.type == 'cuda'
+    if use_pinned:
+        obs_pin = torch.empty(config.num_agents, *envs.observation_space.shape,
+                        dtype=torch.float, pin_memory=True)
+        reward_pin = torch.empty(config.num_agents, 1, dtype=torch.float, pin_memory=True)
+        mask_pin = torch.empty(config.num_agents, 1, dtype=torch.float, pin_memory=True)
+        action_pin = torch.empty(config.num_agents, dtype=torch.long, pin_memory=True)
+
+        obs_dev = torch.empty_like(obs_pin, device=config.device)
+        reward_dev = torch.empty_like(reward_pin, device=config.device)
+        mask_dev = torch.empty_like(mask_pin, device=config.device)
+
     def update_current_obs(obs):
         shape_dim0 = envs.observation_space.shape[0]
-        obs = torch.from_numpy(obs.astype(np.float32)).to(config.device)
+        if use_pinned:
+            obs_pin.copy_(torch.from_numpy(obs))
+            obs_dev.copy_(obs_pin, non_blocking=True)
+            obs = obs_dev
+        else:
+            #upload in the env's native dtype and cast on device
+            obs = torch.from_numpy(obs).to(config.device).float()
         current_obs[:, :-shape_dim0] = current_obs[:, shape_dim0:]
         current_obs[:, -shape_dim0:] = obs
 
@@ -99,6 +130,10 @@ if __name__=='__main__':
     episode_rewards = np.zeros(config.num_agents, dtype=np.float)
     final_rewards = np.zeros(config.num_agents, dtype=np.float)
 
+    #scratch arrays for the per-step bookkeeping, written in place
+    masks_np = np.empty(config.num_agents, dtype=np.float32)
+    finished_rewards = np.empty(config.num_agents, dtype=np.float)
+
     start=timer()
 
     print_step = 1
@@ -108,18 +143,33 @@ if __name__=='__main__':
         for step in range(config.rollout):
             with torch.no_grad():
                 values, actions, action_log_prob = model.get_action(model.rollouts.observations[step])
-            cpu_actions = actions.view(-1).cpu().numpy()
+            if use_pinned:
+                #read actions back through the reusable pinned buffer
+                action_pin.copy_(actions.view(-1), non_blocking=True)
+                torch.cuda.current_stream().synchronize()
+                cpu_actions = action_pin.numpy()
+            else:
+                cpu_actions = actions.view(-1).cpu().numpy()
     
             obs, reward, done, _ = envs.step(cpu_actions)
 
             episode_rewards += reward
-            masks = 1. - done.astype(np.float32)
-            final_rewards *= masks
-            final_rewards += (1. - masks) * episode_rewards
-            episode_rewards *= masks
-
-            rewards = torch.from_numpy(reward.astype(np.float32)).view(-1, 1).to(config.device)
-            masks = torch.from_numpy(masks).to(config.device).view(-1, 1)
+            np.subtract(1., done, out=masks_np)
+            final_rewards *= masks_np
+            np.multiply(episode_rewards, done, out=finished_rewards)
+            final_rewards += finished_rewards
+            episode_rewards *= masks_np
+
+            if use_pinned:
+                reward_pin.copy_(torch.from_numpy(reward).view(-1, 1))
+                reward_dev.copy_(reward_pin, non_blocking=True)
+                rewards = reward_dev
+                mask_pin.copy_(torch.from_numpy(masks_np).view(-1, 1))
+                mask_dev.copy_(mask_pin, non_blocking=True)
+                masks = mask_dev
+            else:
+                rewards = torch.from_numpy(reward.astype(np.float32)).view(-1, 1).to(config.device)
+                masks = torch.from_numpy(masks_np).to(config.device).view(-1, 1)
 
             current_obs *= masks.view(-1, 1, 1, 1)
             update_current_obs(obs)
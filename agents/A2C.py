@@ -11,6 +11,14 @@ from utils.RolloutStorage import RolloutStorage
 
 from timeit import default_timer as timer
 
+@torch.jit.script
+def a2c_loss_terms(returns, values, action_log_probs):
+    #fused advantage/value/action loss chain
+    advantages = returns - values
+    value_loss = advantages.pow(2).mean()
+    action_loss = -(advantages.detach() * action_log_probs).mean()
+    return value_loss, action_loss
+
 class Model(BaseAgent):
     def __init__(self, static_policy=False, env=None, config=None, log_dir='/tmp/gym'):
         super(Model, self).__init__(config=config, env=env, log_dir=log_dir)
@@ -38,11 +46,25 @@ class Model(BaseAgent):
 
         self.declare_networks()
             
-        self.optimizer = optim.RMSprop(self.model.parameters(), lr=self.lr, alpha=0.99, eps=1e-5)
+        #RMSprop has no fused CUDA variant yet; foreach batches the launches
+        self.optimizer = optim.RMSprop(self.model.parameters(), lr=self.lr, alpha=0.99, eps=1e-5, foreach=True)
         
         #move to correct device
         self.model = self.model.to(self.device)
 
+        #NHWC layout lets cuDNN dispatch tensor-core conv kernels
+        self.channels_last = self.device.type == 'cuda'
+        if self.channels_last:
+            self.model = self.model.to(memory_format=torch.channels_last)
+
+        #bf16 autocast needs no GradScaler; optimizer math stays FP32
+        self.amp = self.device.type == 'cuda' and torch.cuda.is_bf16_supported()
+
+        #fuse conv+bias+relu+softmax chains and amortize launch overhead
+        self.compiled = config.USE_COMPILE and hasattr(torch, 'compile') and self.device.type == 'cuda'
+        if self.compiled:
+            self.model = torch.compile(self.model, mode='reduce-overhead')
+
         if self.static_policy:
             self.model.eval()
         else:
@@ -59,54 +81,57 @@ class Model(BaseAgent):
     def declare_networks(self):
         self.model = ActorCritic(self.num_feats, self.num_actions)
 
+    def prep_input(self, s):
+        if self.channels_last and s.dim() == 4:
+            return s.contiguous(memory_format=torch.channels_last)
+        return s
+
     def get_action(self, s, deterministic=False):
-        logits, values = self.model(s)
-        dist = torch.distributions.Categorical(logits=logits)
+        logits, values = self.model(self.prep_input(s))
+
+        #one log_softmax serves both sampling and the log prob lookup
+        log_probs = F.log_softmax(logits, dim=1)
 
         if deterministic:
-            actions = dist.probs.argmax(dim=1, keepdim=True)
+            actions = log_probs.argmax(dim=1, keepdim=True)
         else:
-            actions = dist.sample().view(-1, 1)
+            actions = log_probs.exp().multinomial(1)
 
-        log_probs = F.log_softmax(logits, dim=1)
         action_log_probs = log_probs.gather(1, actions)
 
         return values, actions, action_log_probs
-        
 
-    def evaluate_actions(self, s, actions):
-        logits, values = self.model(s)
 
-        dist = torch.distributions.Categorical(logits=logits)
+    def evaluate_actions(self, s, actions):
+        logits, values = self.model(self.prep_input(s))
 
         log_probs = F.log_softmax(logits, dim=1)
-        action_log_probs = log_probs.gather(1, actions)
+        probs = log_probs.exp()
 
-        dist_entropy = dist.entropy().mean()
+        action_log_probs = log_probs.gather(1, actions)
+        dist_entropy = -(probs * log_probs).sum(-1).mean()
 
         return values, action_log_probs, dist_entropy
 
     def get_values(self, s):
-        _, values = self.model(s)
+        _, values = self.model(self.prep_input(s))
 
         return values
 
     def compute_loss(self, rollouts):
-        obs_shape = rollouts.observations.size()[2:]
-        action_shape = rollouts.actions.size()[-1]
         num_steps, num_processes, _ = rollouts.rewards.size()
 
-        values, action_log_probs, dist_entropy = self.evaluate_actions(
-            rollouts.observations[:-1].view(-1, *obs_shape),
-            rollouts.actions.view(-1, 1))
-
-        values = values.view(num_steps, num_processes, 1)
-        action_log_probs = action_log_probs.view(num_steps, num_processes, 1)
+        #flatten(0, 1) on the contiguous storage is a guaranteed zero-copy view
+        with torch.autocast(device_type='cuda', dtype=torch.bfloat16, enabled=self.amp):
+            values, action_log_probs, dist_entropy = self.evaluate_actions(
+                rollouts.observations[:-1].flatten(0, 1),
+                rollouts.actions.flatten(0, 1))
 
-        advantages = rollouts.returns[:-1] - values
-        value_loss = advantages.pow(2).mean()
+        values = values.float().view(num_steps, num_processes, 1)
+        action_log_probs = action_log_probs.float().view(num_steps, num_processes, 1)
+        dist_entropy = dist_entropy.float()
 
-        action_loss = -(advantages.detach() * action_log_probs).mean()
+        value_loss, action_loss = a2c_loss_terms(rollouts.returns[:-1], values, action_log_probs)
 
         loss = action_loss + self.value_loss_weight * value_loss - self.entropy_loss_weight * dist_entropy
 
@@ -117,7 +142,7 @@ class Model(BaseAgent):
 
         self.optimizer.zero_grad()
         loss.backward()
-        torch.nn.utils.clip_grad_norm_(self.model.parameters(), self.grad_norm_max)
+        torch.nn.utils.clip_grad_norm_(self.model.parameters(), self.grad_norm_max, foreach=True)
         self.optimizer.step()
 
         #self.save_loss(loss.item(), action_loss.item(), value_loss.item(), dist_entropy.item())
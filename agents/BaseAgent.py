@@ -20,6 +20,10 @@ class BaseAgent(object):
         self.action_log_frequency = config.ACTION_SELECTION_COUNT_FREQUENCY
         self.action_selections = [0 for _ in range(env.action_space.n)]
 
+        #filled lazily once the subclass has built its model
+        self._sigma_params = None
+        self._sigma_param_count = 0
+
     def huber(self, x):
         cond = (x.abs() < 1.0).float().detach()
         return 0.5 * x.pow(2) * cond + (x.abs() - 0.5) * (1.0 - cond)
@@ -52,16 +56,18 @@ class BaseAgent(object):
 
     def save_sigma_param_magnitudes(self, tstep):
         with torch.no_grad():
-            sum_, count = 0.0, 0.0
-            for name, param in self.model.named_parameters():
-                if param.requires_grad and 'sigma' in name:
-                    sum_+= torch.sum(param.abs()).item()
-                    count += np.prod(param.shape)
-            
-            if count > 0:
+            if self._sigma_params is None:
+                #scan the names once and keep the filtered list
+                self._sigma_params = [param for name, param in self.model.named_parameters()
+                                      if param.requires_grad and 'sigma' in name]
+                self._sigma_param_count = sum(param.numel() for param in self._sigma_params)
+
+            if self._sigma_params:
+                #single multi-tensor L1 + one sync instead of one .item() per param
+                sum_ = torch.stack(torch._foreach_norm(self._sigma_params, 1)).sum().item()
                 with open(os.path.join(self.log_dir, 'sig_param_mag.csv'), 'a') as f:
                     writer = csv.writer(f)
-                    writer.writerow((tstep, sum_/count))
+                    writer.writerow((tstep, sum_/self._sigma_param_count))
 
     def save_td(self, td, tstep):
         with open(os.path.join(self.log_dir, 'td.csv'), 'a') as f:
@@ -6,10 +6,20 @@ import torch.optim as optim
 from agents.BaseAgent import BaseAgent
 from networks.networks import DQN
 from networks.network_bodies import AtariBody, SimpleBody
-from utils.ReplayMemory import ExperienceReplayMemory, PrioritizedReplayMemory
+from utils.ReplayMemory import TensorReplayMemory, PrioritizedReplayMemory
 
 from timeit import default_timer as timer
 
+@torch.jit.script
+def td_target(batch_reward, max_next_q_values, gamma: float):
+    #fused elementwise tail of the target computation
+    return batch_reward + gamma*max_next_q_values
+
+@torch.jit.script
+def td_target_masked(batch_reward, max_next_q_values, batch_terminal, gamma: float):
+    #fixed-shape variant: terminal rows are zeroed by the mask
+    return batch_reward + gamma*max_next_q_values*(1.0 - batch_terminal)
+
 class Model(BaseAgent):
     def __init__(self, static_policy=False, env=None, config=None, log_dir='/tmp/gym'):
         super(Model, self).__init__(config=config, env=env, log_dir=log_dir)
@@ -29,6 +39,7 @@ class Model(BaseAgent):
         self.priority_beta_start = config.PRIORITY_BETA_START
         self.priority_beta_frames = config.PRIORITY_BETA_FRAMES
         self.priority_alpha = config.PRIORITY_ALPHA
+        self.log_frequency = config.LOG_FREQUENCY
 
         self.static_policy = static_policy
         self.num_feats = env.observation_space.shape
@@ -38,12 +49,48 @@ class Model(BaseAgent):
         self.declare_networks()
             
         self.target_model.load_state_dict(self.model.state_dict())
-        self.optimizer = optim.Adam(self.model.parameters(), lr=self.lr)
-        
+
         #move to correct device
         self.model = self.model.to(self.device)
         self.target_model.to(self.device)
 
+        #NHWC layout lets cuDNN dispatch tensor-core conv kernels
+        self.channels_last = self.device.type == 'cuda' and len(self.num_feats) == 3
+        if self.channels_last:
+            self.model = self.model.to(memory_format=torch.channels_last)
+            self.target_model.to(memory_format=torch.channels_last)
+
+        #fused CUDA Adam steps all params in one kernel; foreach on CPU.
+        #built after the device/layout moves so fused=True sees CUDA params
+        if self.device.type == 'cuda':
+            self.optimizer = optim.Adam(self.model.parameters(), lr=self.lr, fused=True)
+        else:
+            self.optimizer = optim.Adam(self.model.parameters(), lr=self.lr, foreach=True)
+
+        #bf16 autocast needs no GradScaler; optimizer math stays FP32
+        self.amp = self.device.type == 'cuda' and torch.cuda.is_bf16_supported()
+
+        #fuse conv+bias+relu chains and amortize kernel launch overhead
+        self.compiled = config.USE_COMPILE and hasattr(torch, 'compile') and self.device.type == 'cuda'
+        if self.compiled:
+            self.model = torch.compile(self.model, mode='reduce-overhead')
+            self.target_model = torch.compile(self.target_model, mode='reduce-overhead')
+
+        #cached tensor lists so the target sync is one fused multi-tensor copy
+        self._target_sync_dst = list(self.target_model.parameters()) + list(self.target_model.buffers())
+        self._target_sync_src = list(self.model.parameters()) + list(self.model.buffers())
+
+        #replay the whole train step as one CUDA graph; reduce-overhead
+        #compilation already applies cudagraphs, so the manual capture only
+        #covers the uncompiled fixed-shape path (USE_COMPILE=False)
+        self.use_cuda_graph = config.USE_CUDA_GRAPH and self.device.type == 'cuda' \
+            and not self.compiled and not self.priority_replay and not self.noisy
+        if self.use_cuda_graph:
+            self.optimizer = optim.Adam(self.model.parameters(), lr=self.lr, capturable=True)
+        self._graph = None
+        self._graph_warmup = 0
+        self._static_batch = None
+
         if self.static_policy:
             self.model.eval()
             self.target_model.eval()
@@ -54,6 +101,8 @@ class Model(BaseAgent):
         self.update_count = 0
 
         self.declare_memory()
+        #graph replay needs the fixed-shape ring buffer sample
+        self.use_cuda_graph = self.use_cuda_graph and isinstance(self.memory, TensorReplayMemory)
 
         self.nsteps = config.N_STEPS
         self.nstep_buffer = []
@@ -63,7 +112,7 @@ class Model(BaseAgent):
         self.target_model = DQN(self.num_feats, self.num_actions, noisy=self.noisy, sigma_init=self.sigma_init, body=AtariBody)
 
     def declare_memory(self):
-        self.memory = ExperienceReplayMemory(self.experience_replay_size) if not self.priority_replay else PrioritizedReplayMemory(self.experience_replay_size, self.priority_alpha, self.priority_beta_start, self.priority_beta_frames)
+        self.memory = TensorReplayMemory(self.experience_replay_size) if not self.priority_replay else PrioritizedReplayMemory(self.experience_replay_size, self.priority_alpha, self.priority_beta_start, self.priority_beta_frames)
 
     def append_to_replay(self, s, a, r, s_):
         self.nstep_buffer.append((s, a, r, s_))
@@ -79,22 +128,45 @@ class Model(BaseAgent):
     def prep_minibatch(self):
         # random transition batch is taken from experience replay memory
         transitions, indices, weights = self.memory.sample(self.batch_size)
-        
-        batch_state, batch_action, batch_reward, batch_next_state = zip(*transitions)
 
         shape = (-1,)+self.num_feats
 
-        batch_state = torch.tensor(batch_state, device=self.device, dtype=torch.float).view(shape)
-        batch_action = torch.tensor(batch_action, device=self.device, dtype=torch.long).squeeze().view(-1, 1)
-        batch_reward = torch.tensor(batch_reward, device=self.device, dtype=torch.float).squeeze().view(-1, 1)
-        
-        non_final_mask = torch.tensor(tuple(map(lambda s: s is not None, batch_next_state)), device=self.device, dtype=torch.uint8)
-        try: #sometimes all next states are false
-            non_final_next_states = torch.tensor([s for s in batch_next_state if s is not None], device=self.device, dtype=torch.float).view(shape)
-            empty_next_state_values = False
-        except:
-            non_final_next_states = None
-            empty_next_state_values = True
+        if isinstance(transitions, tuple):
+            #batched sample straight from the ring buffer; tensors already
+            #live on the replay device, so there is no per-batch H2D copy
+            batch_state, batch_action, batch_reward, batch_next_state, batch_terminal = transitions
+
+            non_final = ~batch_terminal.to(self.device)
+
+            batch_state = self.norm_observation(batch_state.to(self.device)).view(shape)
+            batch_action = batch_action.to(self.device).view(-1, 1)
+            batch_reward = batch_reward.to(self.device).view(-1, 1)
+
+            non_final_mask = non_final.to(torch.uint8)
+            empty_next_state_values = not non_final.any().item()
+            if not empty_next_state_values:
+                non_final_next_states = self.norm_observation(batch_next_state.to(self.device)[non_final]).view(shape)
+            else:
+                non_final_next_states = None
+        else:
+            batch_state, batch_action, batch_reward, batch_next_state = zip(*transitions)
+
+            batch_state = torch.tensor(batch_state, device=self.device, dtype=torch.float).view(shape)
+            batch_action = torch.tensor(batch_action, device=self.device, dtype=torch.long).squeeze().view(-1, 1)
+            batch_reward = torch.tensor(batch_reward, device=self.device, dtype=torch.float).squeeze().view(-1, 1)
+
+            non_final_mask = torch.tensor(tuple(map(lambda s: s is not None, batch_next_state)), device=self.device, dtype=torch.uint8)
+            try: #sometimes all next states are false
+                non_final_next_states = torch.tensor([s for s in batch_next_state if s is not None], device=self.device, dtype=torch.float).view(shape)
+                empty_next_state_values = False
+            except:
+                non_final_next_states = None
+                empty_next_state_values = True
+
+        if self.channels_last:
+            batch_state = batch_state.contiguous(memory_format=torch.channels_last)
+            if not empty_next_state_values:
+                non_final_next_states = non_final_next_states.contiguous(memory_format=torch.channels_last)
 
         return batch_state, batch_action, batch_reward, non_final_next_states, non_final_mask, empty_next_state_values, indices, weights
 
@@ -103,16 +175,19 @@ class Model(BaseAgent):
 
         #estimate
         self.model.sample_noise()
-        current_q_values = self.model(batch_state).gather(1, batch_action)
-        
+        with torch.autocast(device_type='cuda', dtype=torch.bfloat16, enabled=self.amp):
+            current_q_values = self.model(batch_state).gather(1, batch_action)
+        current_q_values = current_q_values.float()
+
         #target
         with torch.no_grad():
             max_next_q_values = torch.zeros(self.batch_size, device=self.device, dtype=torch.float).unsqueeze(dim=1)
             if not empty_next_state_values:
-                max_next_action = self.get_max_next_state_action(non_final_next_states)
                 self.target_model.sample_noise()
-                max_next_q_values[non_final_mask] = self.target_model(non_final_next_states).gather(1, max_next_action)
-            expected_q_values = batch_reward + ((self.gamma**self.nsteps)*max_next_q_values)
+                with torch.autocast(device_type='cuda', dtype=torch.bfloat16, enabled=self.amp):
+                    max_next_q = self.compute_max_next_q(non_final_next_states)
+                max_next_q_values[non_final_mask] = max_next_q.float()
+            expected_q_values = td_target(batch_reward, max_next_q_values, self.gamma**self.nsteps)
 
         diff = (expected_q_values - current_q_values)
         if self.priority_replay:
@@ -124,6 +199,92 @@ class Model(BaseAgent):
 
         return loss
 
+    def prep_minibatch_static(self):
+        #fixed-shape variant for CUDA graph replay: the full next state batch
+        #with a terminal mask instead of a variable-size non-final slice
+        (batch_state, batch_action, batch_reward,
+            batch_next_state, batch_terminal), _, _ = self.memory.sample(self.batch_size)
+
+        shape = (-1,)+self.num_feats
+
+        batch_state = self.norm_observation(batch_state.to(self.device)).view(shape)
+        batch_next_state = self.norm_observation(batch_next_state.to(self.device)).view(shape)
+        batch_action = batch_action.to(self.device).view(-1, 1)
+        batch_reward = batch_reward.to(self.device).view(-1, 1)
+        batch_terminal = batch_terminal.to(self.device, torch.float).view(-1, 1)
+
+        if self.channels_last:
+            batch_state = batch_state.contiguous(memory_format=torch.channels_last)
+            batch_next_state = batch_next_state.contiguous(memory_format=torch.channels_last)
+
+        return batch_state, batch_action, batch_reward, batch_next_state, batch_terminal
+
+    def compute_loss_static(self, batch_state, batch_action, batch_reward, batch_next_state, batch_terminal):
+        with torch.autocast(device_type='cuda', dtype=torch.bfloat16, enabled=self.amp):
+            current_q_values = self.model(batch_state).gather(1, batch_action)
+        current_q_values = current_q_values.float()
+
+        with torch.no_grad():
+            with torch.autocast(device_type='cuda', dtype=torch.bfloat16, enabled=self.amp):
+                max_next_q = self.compute_max_next_q(batch_next_state)
+            #terminal rows hold zero frames; the mask zeroes their bootstrap
+            expected_q_values = td_target_masked(batch_reward, max_next_q.float(), batch_terminal, self.gamma**self.nsteps)
+
+        diff = (expected_q_values - current_q_values)
+        return self.MSE(diff).mean()
+
+    def clamp_grads(self):
+        grads = [param.grad for param in self.model.parameters() if param.grad is not None]
+        if hasattr(torch, '_foreach_clamp_min_'):
+            #two multi-tensor kernels instead of one launch per parameter
+            torch._foreach_clamp_min_(grads, -1)
+            torch._foreach_clamp_max_(grads, 1)
+        else:
+            for grad in grads:
+                grad.data.clamp_(-1, 1)
+
+    def train_step_static(self, *batch):
+        #grads must stay allocated between graph replays
+        self.optimizer.zero_grad(set_to_none=False)
+        loss = self.compute_loss_static(*batch)
+        loss.backward()
+        self.clamp_grads()
+        self.optimizer.step()
+        return loss
+
+    def update_graphed(self, frame):
+        batch = self.prep_minibatch_static()
+
+        if self._static_batch is None:
+            self._static_batch = list(batch)
+        else:
+            for static, new in zip(self._static_batch, batch):
+                static.copy_(new, non_blocking=True)
+
+        if self._graph is not None:
+            self._graph.replay()
+            loss = self._static_loss
+        elif self._graph_warmup < 3:
+            #eager warmup on a side stream before capture
+            stream = torch.cuda.Stream()
+            stream.wait_stream(torch.cuda.current_stream())
+            with torch.cuda.stream(stream):
+                loss = self.train_step_static(*self._static_batch)
+            torch.cuda.current_stream().wait_stream(stream)
+            self._graph_warmup += 1
+        else:
+            self._graph = torch.cuda.CUDAGraph()
+            with torch.cuda.graph(self._graph):
+                self._static_loss = self.train_step_static(*self._static_batch)
+            self._graph.replay()
+            loss = self._static_loss
+
+        self.update_target_model()
+        if frame % self.log_frequency == 0:
+            #the .item() reads serialize the stream; only pay for them on stride
+            self.save_td(loss.item(), frame)
+            self.save_sigma_param_magnitudes(frame)
+
     def update(self, s, a, r, s_, frame=0):
         if self.static_policy:
             return None
@@ -133,6 +294,9 @@ class Model(BaseAgent):
         if frame < self.learn_start or frame % self.update_freq != 0:
             return None
 
+        if self.use_cuda_graph:
+            return self.update_graphed(frame)
+
         batch_vars = self.prep_minibatch()
 
         loss = self.compute_loss(batch_vars)
@@ -140,18 +304,31 @@ class Model(BaseAgent):
         # Optimize the model
         self.optimizer.zero_grad()
         loss.backward()
-        for param in self.model.parameters():
-            param.grad.data.clamp_(-1, 1)
+        self.clamp_grads()
         self.optimizer.step()
 
         self.update_target_model()
-        self.save_td(loss.item(), frame)
-        self.save_sigma_param_magnitudes(frame)
+        if frame % self.log_frequency == 0:
+            self.save_td(loss.item(), frame)
+            self.save_sigma_param_magnitudes(frame)
+
+    def norm_observation(self, X):
+        #uint8 frames go to the model raw so the body can cast+normalize
+        #them; non-image states only need widening to float32
+        if X.dtype == torch.uint8:
+            return X
+        return X.float()
+
+    def prep_observation(self, s):
+        X = self.norm_observation(torch.from_numpy(np.asarray(s)).to(self.device).unsqueeze(0))
+        if self.channels_last and X.dim() == 4:
+            X = X.contiguous(memory_format=torch.channels_last)
+        return X
 
     def get_action(self, s, eps=0.1): #faster
         with torch.no_grad():
             if np.random.random() >= eps or self.static_policy or self.noisy:
-                X = torch.tensor([s], device=self.device, dtype=torch.float)
+                X = self.prep_observation(s)
                 self.model.sample_noise()
                 a = self.model(X).max(1)[1].view(1, 1)
                 return a.item()
@@ -162,11 +339,24 @@ class Model(BaseAgent):
         self.update_count+=1
         self.update_count = self.update_count % self.target_net_update_freq
         if self.update_count == 0:
-            self.target_model.load_state_dict(self.model.state_dict())
+            if hasattr(torch, '_foreach_copy_'):
+                with torch.no_grad():
+                    torch._foreach_copy_(self._target_sync_dst, self._target_sync_src)
+            else:
+                self.target_model.load_state_dict(self.model.state_dict())
 
     def get_max_next_state_action(self, next_states):
         return self.target_model(next_states).max(dim=1)[1].view(-1, 1)
 
+    def compute_max_next_q(self, next_states):
+        if type(self).get_max_next_state_action is not Model.get_max_next_state_action:
+            #subclasses that customize action selection through the classic
+            #hook (e.g. Double-DQN) must keep driving the target gather
+            max_next_action = self.get_max_next_state_action(next_states)
+            return self.target_model(next_states).gather(1, max_next_action)
+        #one target forward + amax; no indices tensor and no second pass
+        return self.target_model(next_states).amax(dim=1, keepdim=True)
+
     def finish_nstep(self):
         while len(self.nstep_buffer) > 0:
             R = sum([self.nstep_buffer[i][2]*(self.gamma**i) for i in range(len(self.nstep_buffer))])
@@ -4,9 +4,18 @@ import torch
 
 from agents.DQN import Model as DQN_Agent
 
+@torch.jit.script
+def double_q_target(next_online_q, next_target_q):
+    #argmax on the online net, gather on the target net, fused
+    max_next_action = next_online_q.argmax(dim=1, keepdim=True)
+    return next_target_q.gather(1, max_next_action)
+
 class Model(DQN_Agent):
     def __init__(self, static_policy=False, env=None, config=None, log_dir='/tmp/gym'):
         super(Model, self).__init__(static_policy, env, config, log_dir=log_dir)
 
     def get_max_next_state_action(self, next_states):
-        return self.model(next_states).max(dim=1)[1].view(-1, 1) 
+        return self.model(next_states).max(dim=1)[1].view(-1, 1)
+
+    def compute_max_next_q(self, next_states):
+        return double_q_target(self.model(next_states), self.target_model(next_states))
@@ -22,7 +22,10 @@ class Model(A2C):
         self.num_mini_batch = config.num_mini_batch
         self.clip_param = config.ppo_clip_param
 
-        self.optimizer = optim.Adam(self.model.parameters(), lr=self.lr, eps=1e-5)
+        if config.device.type == 'cuda':
+            self.optimizer = optim.Adam(self.model.parameters(), lr=self.lr, eps=1e-5, fused=True)
+        else:
+            self.optimizer = optim.Adam(self.model.parameters(), lr=self.lr, eps=1e-5, foreach=True)
 
     def compute_loss(self, sample):
         observations_batch, actions_batch, return_batch, masks_batch, old_action_log_probs_batch, adv_targ = sample
@@ -59,7 +62,7 @@ class Model(A2C):
 
                 self.optimizer.zero_grad()
                 loss.backward()
-                torch.nn.utils.clip_grad_norm_(self.model.parameters(), self.grad_norm_max)
+                torch.nn.utils.clip_grad_norm_(self.model.parameters(), self.grad_norm_max, foreach=True)
                 self.optimizer.step()
 
                 value_loss_epoch += value_loss.item()
@@ -59,7 +59,7 @@ class Model(DQN_Agent):
     def get_action(self, s, eps):
         with torch.no_grad():
             if np.random.random() >= eps or self.static_policy or self.noisy:
-                X = torch.tensor([s], device=self.device, dtype=torch.float) 
+                X = self.prep_observation(s)
                 self.model.sample_noise()
                 a = (self.model(X) * self.quantile_weight).sum(dim=2).max(dim=1)[1]
                 return a.item()
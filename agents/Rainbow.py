@@ -74,7 +74,7 @@ class Model(DQN_Agent):
 
     def get_action(self, s, eps):
         with torch.no_grad():
-            X = torch.tensor([s], device=self.device, dtype=torch.float)
+            X = self.prep_observation(s)
             self.model.sample_noise()
             a = self.model(X) * self.supports
             a = a.sum(dim=2).max(1)[1].view(1, 1)
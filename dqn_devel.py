@@ -60,6 +60,7 @@ config.SEQUENCE_LENGTH = 8
 
 #data logging parameters
 config.ACTION_SELECTION_COUNT_FREQUENCY = 1000
+config.LOG_FREQUENCY = 100
 
 if __name__=='__main__':
     start=timer()
@@ -78,7 +79,7 @@ if __name__=='__main__':
     env_id = "PongNoFrameskip-v4"
     env    = make_atari(env_id)
     env    = bench.Monitor(env, os.path.join(log_dir, env_id))
-    env    = wrap_deepmind(env, episode_life=True, clip_rewards=True, frame_stack=False, scale=True)
+    env    = wrap_deepmind(env, episode_life=True, clip_rewards=True, frame_stack=False, scale=False)
     env    = WrapPyTorch(env)
     model  = Model(env=env, config=config, log_dir=log_dir)
 
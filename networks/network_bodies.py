@@ -17,8 +17,14 @@ class AtariBody(nn.Module):
         self.conv2 = nn.Conv2d(32, 64, kernel_size=4, stride=2)
         self.conv3 = nn.Conv2d(64, 32, kernel_size=3, stride=1)
 
-        
+        #frozen frame normalization; applying it inside the body lets the
+        #compiler fuse the scale with the input cast and first conv
+        self.register_buffer('inv_norm', torch.tensor(1.0/255.0))
+
+
     def forward(self, x):
+        if x.dtype == torch.uint8: #raw frames; pre-scaled floats pass through
+            x = x.float() * self.inv_norm
         x = F.relu(self.conv1(x))
         x = F.relu(self.conv2(x))
         x = F.relu(self.conv3(x))
@@ -271,10 +271,13 @@ class ActorCritic(nn.Module):
 
         self.actor_linear = init_(nn.Linear(512, num_actions))
 
+        #frozen frame normalization kept inside the model
+        self.register_buffer('inv_norm', torch.tensor(1.0/255.0))
+
         self.train()
 
     def forward(self, inputs):
-        x = F.relu(self.conv1(inputs/255.0))
+        x = F.relu(self.conv1(inputs * self.inv_norm))
         x = F.relu(self.conv2(x))
         x = F.relu(self.conv3(x))
         x = x.view(x.size(0), -1)
@@ -318,10 +321,13 @@ class ActorCriticER(nn.Module):
 
         self.actor_linear = init_(nn.Linear(512, num_actions))
 
+        #frozen frame normalization kept inside the model
+        self.register_buffer('inv_norm', torch.tensor(1.0/255.0))
+
         self.train()
 
     def forward(self, inputs):
-        x = F.relu(self.conv1(inputs/255.0))
+        x = F.relu(self.conv1(inputs * self.inv_norm))
         x = F.relu(self.conv2(x))
         x = F.relu(self.conv3(x))
         x = x.view(x.size(0), -1)
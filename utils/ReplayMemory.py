@@ -23,6 +23,72 @@ class ExperienceReplayMemory:
         return len(self.memory)
 
 
+class TensorReplayMemory:
+    def __init__(self, capacity):
+        self.capacity = capacity
+
+        #SoA ring buffer; tensors are sized on the first push once the
+        #observation shape/dtype is known. uint8 frames are kept on the
+        #GPU so sampling is an index_select with no H2D copy; float
+        #observations are 4x larger, so those buffers stay in host memory
+        self.states = None
+        self.actions = None
+        self.rewards = None
+        self.next_states = None
+        self.terminals = None
+
+        self.pos = 0
+        self.size = 0
+
+    def _allocate(self, state):
+        buf_device = device if state.dtype == torch.uint8 else torch.device('cpu')
+        self.states = torch.empty((self.capacity,)+state.shape, dtype=state.dtype, device=buf_device)
+        self.next_states = torch.empty_like(self.states)
+        self.actions = torch.empty(self.capacity, dtype=torch.int64, device=buf_device)
+        self.rewards = torch.empty(self.capacity, dtype=torch.float, device=buf_device)
+        self.terminals = torch.empty(self.capacity, dtype=torch.bool, device=buf_device)
+
+        #pinned staging keeps the per-push observation copy on the DMA path
+        self._state_pin = torch.empty(state.shape, dtype=state.dtype, pin_memory=True) \
+            if buf_device.type == 'cuda' else None
+
+    def _write_state(self, buffer, pos, state):
+        state = torch.from_numpy(np.asarray(state))
+        if self._state_pin is not None:
+            self._state_pin.copy_(state)
+            state = self._state_pin
+        buffer[pos].copy_(state)
+
+    def push(self, transition):
+        state, action, reward, next_state = transition
+
+        if self.states is None:
+            self._allocate(torch.from_numpy(np.asarray(state)))
+
+        self._write_state(self.states, self.pos, state)
+        self.actions[self.pos] = action
+        self.rewards[self.pos] = reward
+        if next_state is None: #terminal transition
+            self.terminals[self.pos] = True
+            self.next_states[self.pos] = 0
+        else:
+            self.terminals[self.pos] = False
+            self._write_state(self.next_states, self.pos, next_state)
+
+        self.pos = (self.pos + 1) % self.capacity
+        self.size = min(self.size + 1, self.capacity)
+
+    def sample(self, batch_size):
+        idx = torch.randint(0, self.size, (batch_size,), device=self.states.device)
+        batch = (self.states.index_select(0, idx), self.actions.index_select(0, idx),
+                 self.rewards.index_select(0, idx), self.next_states.index_select(0, idx),
+                 self.terminals.index_select(0, idx))
+        return batch, None, None
+
+    def __len__(self):
+        return self.size
+
+
 class PrioritizedReplayMemory(object):
     def __init__(self, size, alpha=0.6, beta_start=0.4, beta_frames=100000):
         """Create Prioritized Replay buffer.
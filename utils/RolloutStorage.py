@@ -54,12 +54,12 @@ class RolloutStorage(object):
         mini_batch_size = batch_size // num_mini_batch
         sampler = BatchSampler(SubsetRandomSampler(range(batch_size)), mini_batch_size, drop_last=False)
         for indices in sampler:
-            observations_batch = self.observations[:-1].view(-1,
-                                        *self.observations.size()[2:])[indices]
-            actions_batch = self.actions.view(-1, self.actions.size(-1))[indices]
-            return_batch = self.returns[:-1].view(-1, 1)[indices]
-            masks_batch = self.masks[:-1].view(-1, 1)[indices]
-            old_action_log_probs_batch = self.action_log_probs.view(-1, 1)[indices]
-            adv_targ = advantages.view(-1, 1)[indices]
+            #flatten(0, 1) keeps the T x N batch a zero-copy view
+            observations_batch = self.observations[:-1].flatten(0, 1)[indices]
+            actions_batch = self.actions.flatten(0, 1)[indices]
+            return_batch = self.returns[:-1].flatten(0, 1)[indices]
+            masks_batch = self.masks[:-1].flatten(0, 1)[indices]
+            old_action_log_probs_batch = self.action_log_probs.flatten(0, 1)[indices]
+            adv_targ = advantages.flatten(0, 1)[indices]
 
             yield observations_batch, actions_batch, return_batch, masks_batch, old_action_log_probs_batch, adv_targ
\ No newline at end of file
@@ -23,6 +23,12 @@ class Config(object):
         #algorithm control
         self.USE_NOISY_NETS=False
         self.USE_PRIORITY_REPLAY=False
+
+        #performance control; compile and manual graph capture are mutually
+        #exclusive, so turning compile off is what makes the graph path live
+        self.USE_COMPILE=True
+        self.USE_CUDA_GRAPH=False
+        self.USE_SHMEM_VECENV=True
         
         #Multi-step returns
         self.N_STEPS = 1
@@ -66,6 +72,8 @@ class Config(object):
 
         #data logging parameters
         self.ACTION_SELECTION_COUNT_FREQUENCY = 1000
+        #log td/sigma every N frames; each log forces a device sync
+        self.LOG_FREQUENCY = 100
 
 
 '''